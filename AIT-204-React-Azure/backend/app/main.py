@@ -11,10 +11,35 @@ Key Features:
 - Production-ready error handling
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from .routes import router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan handler.
+
+    Code before `yield` runs when the application starts, code after
+    `yield` runs when it shuts down.
+    Useful for:
+    - Initializing and closing database connections
+    - Loading configuration and warming caches
+    - Setting up and cleaning up background tasks
+    """
+    print("🚀 Todo API is starting up...")
+    print("📝 API Documentation available at:")
+    print("   - Swagger UI: http://localhost:8000/docs")
+    print("   - ReDoc: http://localhost:8000/redoc")
+
+    yield
+
+    print("👋 Todo API is shutting down...")
+
+
 # Create FastAPI application instance
 app = FastAPI(
     title="Todo API",
@@ -22,6 +47,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",  # Swagger UI at /docs
     redoc_url="/redoc",  # ReDoc at /redoc
+    default_response_class=ORJSONResponse,  # Serialize responses with orjson
+    lifespan=lifespan,  # Startup and shutdown logic
 )
 
 # Configure CORS (Cross-Origin Resource Sharing)
@@ -42,8 +69,8 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,  # List of allowed origins
     allow_credentials=True,  # Allow cookies and authentication
-    allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, etc.)
-    allow_headers=["*"],  # Allow all headers
+    allow_methods=["GET", "POST", "PUT", "DELETE"],  # HTTP methods used by the API
+    allow_headers=["Content-Type", "Authorization"],  # Headers sent by the frontend
 )
 
 # Include the router from routes.py
@@ -51,41 +78,27 @@ app.add_middleware(
 app.include_router(router)
 
 
-# Optional: Add startup and shutdown events
-@app.on_event("startup")
-async def startup_event():
-    """
-    Code to run when the application starts.
-    Useful for:
-    - Initializing database connections
-    - Loading configuration
-    - Setting up background tasks
-    """
-    print("🚀 Todo API is starting up...")
-    print("📝 API Documentation available at:")
-    print("   - Swagger UI: http://localhost:8000/docs")
-    print("   - ReDoc: http://localhost:8000/redoc")
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """
-    Code to run when the application shuts down.
-    Useful for:
-    - Closing database connections
-    - Cleaning up resources
-    - Saving state
-    """
-    print("👋 Todo API is shutting down...")
-
-
 # This allows running the app directly with `python -m app.main`
-# For development only - use uvicorn for production
+# Set DEV=1 for auto-reload during development
+# WEB_CONCURRENCY sets the number of worker processes. It defaults to 1
+# because the todos are stored in memory per process - only raise it
+# once routes.py uses a shared store (e.g. a database or Redis)
+# Per-request access logging is off unless UVICORN_ACCESS_LOG=1
 if __name__ == "__main__":
+    import os
     import uvicorn
+
+    dev_mode = os.environ.get("DEV") == "1"
+    access_log = os.environ.get("UVICORN_ACCESS_LOG", "0") == "1"
+
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True  # Auto-reload on code changes (development only)
+        workers=1 if dev_mode else int(os.environ.get("WEB_CONCURRENCY", "1")),
+        loop="uvloop",  # libuv-based event loop (installed by uvicorn[standard])
+        http="httptools",  # C HTTP parser (installed by uvicorn[standard])
+        reload=dev_mode,  # Auto-reload on code changes (development only)
+        access_log=access_log,
+        log_level="info" if dev_mode else "warning",
     )
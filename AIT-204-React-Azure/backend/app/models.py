@@ -47,6 +47,8 @@ class Todo(TodoBase):
     Config:
         from_attributes: Allows converting ORM models to Pydantic models
         This is useful when upgrading to use a real database with SQLAlchemy
+        validate_assignment: Disabled so server-side updates don't re-run
+        validation on data that was already validated
     """
     id: int = Field(..., description="Unique identifier for the todo")
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Creation timestamp")
@@ -54,6 +56,7 @@ class Todo(TodoBase):
 
     class Config:
         from_attributes = True  # Allows ORM mode for future database integration
+        validate_assignment = False  # Skip re-validation on attribute assignment
 
 
 class HealthCheck(BaseModel):
@@ -13,26 +13,104 @@ Endpoints:
 - DELETE /api/todos/{id} - Delete a todo
 """
 
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response
+from typing import Deque, Dict, List, Optional
+from collections import deque
 from datetime import datetime
+from itertools import count
+import time
+import uuid
+import orjson
 from .models import Todo, TodoCreate, TodoUpdate, HealthCheck
 
 # Create an API router instance
 # This organizes routes and can be included in the main app
 router = APIRouter()
 
+# NOTE: Routes that return Todo objects we built ourselves document their
+# response type with `responses={200: {"model": ...}}` instead of
+# `response_model`. The OpenAPI docs stay the same, but FastAPI skips
+# re-validating already-valid objects on every request. POST keeps
+# `response_model` since it defines the public create contract.
+
 # In-memory storage for todos
 # NOTE: This resets when the server restarts
 # For production, use a database like PostgreSQL or MongoDB
-todos_db: List[Todo] = []
+# Each uvicorn worker process gets its own copy, so running with more than
+# one worker requires moving this to a shared store first
+# Todos are keyed by ID so lookups, updates and deletes are O(1)
+todos_db: Dict[int, Todo] = {}
 
 # Counter for generating unique IDs
 # In a real database, this would be handled automatically
-next_id: int = 1
+# next() on itertools.count is atomic under the GIL, so no global is needed
+_id_gen = count(1)
+
+# Free list of deleted Todo instances, reused by create_todo
+# Recycling objects cuts short-lived allocations (and GC work) when todos
+# are created and deleted frequently
+_FREE_POOL_MAX = 1024
+_free_pool: Deque[Todo] = deque()
+
+
+def _acquire_todo(**fields) -> Todo:
+    """Return a Todo with the given fields, reusing a pooled instance if any."""
+    if _free_pool:
+        todo = _free_pool.popleft()
+        todo.__dict__.update(fields)
+        return todo
+    return Todo.model_construct(**fields)
+
+
+def _release_todo(todo: Todo):
+    """Return a deleted Todo to the free list (up to _FREE_POOL_MAX)."""
+    if len(_free_pool) < _FREE_POOL_MAX:
+        _free_pool.append(todo)
+
+
+# Pre-serialized JSON body for GET /api/todos
+# Built lazily on the first read and dropped whenever the store changes
+_todos_json_cache: Optional[bytes] = None
 
+# Version of the todo list, bumped on every change
+# Used as the ETag so clients polling /api/todos get 304 Not Modified
+# when nothing changed since their last request
+# The per-process token keeps ETags from a previous server run from matching
+_version: int = 0
+_etag_token: str = uuid.uuid4().hex[:8]
 
-@router.get("/", response_model=HealthCheck, tags=["Health"])
+
+def _invalidate():
+    """Drop the cached /api/todos body and bump the version after a change."""
+    global _todos_json_cache, _version
+    _todos_json_cache = None
+    _version += 1
+
+
+# Pre-serialized JSON body for the health check
+# Rebuilt at most once per second, so the timestamp stays live without
+# building and validating a HealthCheck model on every probe
+_HEALTH_REFRESH_SECONDS = 1.0
+_health_body: bytes = b""
+_health_expires_at: float = 0.0
+
+
+def _health_check_body() -> bytes:
+    """Return the cached health check body, refreshing it when stale."""
+    global _health_body, _health_expires_at
+    now = time.monotonic()
+    if now >= _health_expires_at:
+        _health_body = orjson.dumps({
+            "status": "healthy",
+            "message": "Todo API is running",
+            "timestamp": datetime.utcnow(),
+        })
+        _health_expires_at = now + _HEALTH_REFRESH_SECONDS
+    return _health_body
+
+
+@router.get("/", response_class=Response, responses={200: {"model": HealthCheck}}, tags=["Health"])
 async def health_check():
     """
     Health check endpoint to verify the API is running.
@@ -47,17 +125,17 @@ async def health_check():
             "timestamp": "2024-01-01T12:00:00"
         }
     """
-    return HealthCheck(
-        status="healthy",
-        message="Todo API is running"
-    )
+    return Response(content=_health_check_body(), media_type="application/json")
 
 
-@router.get("/api/todos", response_model=List[Todo], tags=["Todos"])
-async def get_todos():
+@router.get("/api/todos", response_class=Response, responses={200: {"model": List[Todo]}}, tags=["Todos"])
+async def get_todos(request: Request):
     """
     Retrieve all todos from the database.
 
+    Responses carry an ETag. If the client sends it back in If-None-Match
+    and the list hasn't changed, a 304 Not Modified with no body is returned.
+
     Returns:
         List[Todo]: List of all todo items
 
@@ -73,7 +151,24 @@ async def get_todos():
             }
         ]
     """
-    return todos_db
+    global _todos_json_cache
+
+    # The client already has the current list
+    etag = f'W/"{_etag_token}-{_version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    # Serialize only when the store has changed since the last read
+    if _todos_json_cache is None:
+        _todos_json_cache = orjson.dumps(
+            [todo.model_dump(mode="json") for todo in todos_db.values()]
+        )
+
+    return Response(
+        content=_todos_json_cache,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
 
 @router.post("/api/todos", response_model=Todo, status_code=status.HTTP_201_CREATED, tags=["Todos"])
@@ -94,26 +189,29 @@ async def create_todo(todo: TodoCreate):
             "completed": false
         }
     """
-    global next_id
+    new_id = next(_id_gen)
+    now = datetime.utcnow()
 
     # Create a new Todo instance with all fields
-    new_todo = Todo(
-        id=next_id,
+    # The input was already validated as TodoCreate, so the instance is
+    # built with model_construct (or recycled) without re-running validators
+    new_todo = _acquire_todo(
+        id=new_id,
         title=todo.title,
         description=todo.description,
         completed=todo.completed,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
+        created_at=now,
+        updated_at=now
     )
 
-    # Add to database and increment ID counter
-    todos_db.append(new_todo)
-    next_id += 1
+    # Add to database
+    todos_db[new_id] = new_todo
+    _invalidate()
 
     return new_todo
 
 
-@router.get("/api/todos/{todo_id}", response_model=Todo, tags=["Todos"])
+@router.get("/api/todos/{todo_id}", responses={200: {"model": Todo}}, tags=["Todos"])
 async def get_todo(todo_id: int):
     """
     Retrieve a specific todo by ID.
@@ -127,19 +225,20 @@ async def get_todo(todo_id: int):
     Raises:
         HTTPException: 404 if todo not found
     """
-    # Search for the todo in the database
-    for todo in todos_db:
-        if todo.id == todo_id:
-            return todo
+    # Look up the todo in the database
+    todo = todos_db.get(todo_id)
 
     # If not found, raise 404 error
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"Todo with id {todo_id} not found"
-    )
+    if todo is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Todo with id {todo_id} not found"
+        )
+
+    return todo
 
 
-@router.put("/api/todos/{todo_id}", response_model=Todo, tags=["Todos"])
+@router.put("/api/todos/{todo_id}", responses={200: {"model": Todo}}, tags=["Todos"])
 async def update_todo(todo_id: int, todo_update: TodoUpdate):
     """
     Update an existing todo item.
@@ -161,25 +260,32 @@ async def update_todo(todo_id: int, todo_update: TodoUpdate):
         }
     """
     # Find the todo to update
-    for todo in todos_db:
-        if todo.id == todo_id:
-            # Update only the fields that were provided
-            # exclude_unset=True means only update fields that were explicitly set
-            update_data = todo_update.model_dump(exclude_unset=True)
+    todo = todos_db.get(todo_id)
 
-            for field, value in update_data.items():
-                setattr(todo, field, value)
+    # If not found, raise 404 error
+    if todo is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Todo with id {todo_id} not found"
+        )
 
-            # Update the timestamp
-            todo.updated_at = datetime.utcnow()
+    # Update only the fields that were provided
+    # exclude_unset=True means only update fields that were explicitly set
+    update_data = todo_update.model_dump(exclude_unset=True)
 
-            return todo
+    # Nothing to change - return the todo as is
+    if not update_data:
+        return todo
 
-    # If not found, raise 404 error
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"Todo with id {todo_id} not found"
-    )
+    # Update the timestamp
+    update_data["updated_at"] = datetime.utcnow()
+
+    # Build the updated copy in one step instead of setattr per field
+    updated_todo = todo.model_copy(update=update_data)
+    todos_db[todo_id] = updated_todo
+    _invalidate()
+
+    return updated_todo
 
 
 @router.delete("/api/todos/{todo_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Todos"])
@@ -196,16 +302,16 @@ async def delete_todo(todo_id: int):
     Raises:
         HTTPException: 404 if todo not found
     """
-    global todos_db
-
     # Find and remove the todo
-    for index, todo in enumerate(todos_db):
-        if todo.id == todo_id:
-            todos_db.pop(index)
-            return  # Return 204 No Content
+    todo = todos_db.pop(todo_id, None)
 
     # If not found, raise 404 error
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"Todo with id {todo_id} not found"
-    )
+    if todo is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Todo with id {todo_id} not found"
+        )
+
+    _release_todo(todo)
+    _invalidate()
+    return  # Return 204 No Content
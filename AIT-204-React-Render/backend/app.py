@@ -16,11 +16,15 @@ Key Concepts:
 # Import required libraries
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 from PIL import Image
+import asyncio
+from contextlib import asynccontextmanager
 import io
 import logging
+import os
 
 # Import our custom model class
 from model import ImageClassifier
@@ -29,16 +33,69 @@ from model import ImageClassifier
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Maximum accepted upload size (10 MB) and the chunk size used to read it
+# Uploads are read in chunks so oversized files are rejected early
+# instead of being buffered into memory in full
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# ============================================================================
+# APPLICATION LIFESPAN
+# ============================================================================
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Startup and shutdown logic for the application
+
+    Code before `yield` runs once when the server starts:
+    - Register PIL's image format plugins and run a dummy JPEG/PNG decode
+    - Warm up the model so the first real request doesn't pay the
+      one-time cost of the first forward pass
+    - Create the batch queue and start the batch worker task
+
+    Code after `yield` runs when the server shuts down.
+    """
+    global _batch_queue, _batch_worker_task
+
+    # PIL imports its format plugins lazily on first use; load them all now
+    # and decode a tiny JPEG and PNG so the decoders are ready too
+    Image.init()
+    for image_format in ("JPEG", "PNG"):
+        warmup_buffer = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(warmup_buffer, format=image_format)
+        warmup_buffer.seek(0)
+        Image.open(warmup_buffer).convert('RGB').load()
+
+    # Run one dummy image through the model
+    try:
+        classifier.predict(Image.new('RGB', (224, 224)))
+        logger.info("Model warmed up")
+    except Exception as e:
+        logger.error(f"Model warmup failed: {str(e)}")
+
+    _batch_queue = asyncio.Queue()
+    _batch_worker_task = asyncio.create_task(_batch_worker())
+
+    yield
+
+    _batch_worker_task.cancel()
+
+
 # ============================================================================
 # APPLICATION SETUP
 # ============================================================================
 
 # Create the FastAPI application instance
 # This is the main object that handles all HTTP requests
+# ORJSONResponse serializes responses with orjson (a fast C extension)
+# instead of the standard library json module
 app = FastAPI(
     title="Deep Learning Image Classification API",
     description="API for classifying images using PyTorch",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # ============================================================================
@@ -51,19 +108,25 @@ app = FastAPI(
 
 app.add_middleware(
     CORSMiddleware,
-    # allow_origins=["*"] means allow requests from ANY domain
-    # In production, you should specify exact domains like:
-    # allow_origins=["https://your-frontend.onrender.com"]
-    allow_origins=["*"],
+    # Explicit list of domains allowed to call this API
+    # Browsers reject allow_origins=["*"] together with allow_credentials=True,
+    # so list the exact frontend URLs instead
+    allow_origins=[
+        "http://localhost:3000",                 # Local React dev server
+        "https://your-frontend.onrender.com",    # Replace with your Render frontend URL
+    ],
+
+    # Also allow any *.onrender.com subdomain (e.g. preview deployments)
+    allow_origin_regex=r"https://.*\.onrender\.com",
 
     # Allow browsers to send cookies/authentication
     allow_credentials=True,
 
-    # Allow all HTTP methods (GET, POST, PUT, DELETE, etc.)
-    allow_methods=["*"],
+    # Only the HTTP methods this API actually uses
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
 
-    # Allow all headers in requests
-    allow_headers=["*"],
+    # Only the request headers the frontend sends
+    allow_headers=["Content-Type", "Authorization"],
 )
 
 # ============================================================================
@@ -81,6 +144,122 @@ except Exception as e:
     logger.error(f"Failed to load model: {str(e)}")
     # If model fails to load, the app will still start but predictions will fail
 
+
+def _decode_image(buffer):
+    """
+    Decode an uploaded image into an RGB PIL Image
+
+    PIL decoding is blocking CPU work, so this runs in a worker thread
+    (via run_in_threadpool) to keep the event loop free to serve other
+    requests in the meantime.
+
+    Args:
+        buffer: File-like object containing the raw image bytes
+
+    Returns:
+        PIL.Image: The decoded RGB image
+    """
+    # Convert the buffered bytes into a PIL Image object
+    # PIL (Python Imaging Library) is used for image manipulation
+    image = Image.open(buffer)
+
+    # For JPEGs, ask libjpeg to decode at a reduced scale (1/2, 1/4, 1/8)
+    # that still keeps both sides at least 256 pixels, the size the
+    # model's preprocessing resizes to anyway. Large photos then decode
+    # several times faster. This is a no-op for other formats.
+    image.draft('RGB', (256, 256))
+
+    # Convert image to RGB mode if it's not already
+    # Some images might be in RGBA (with alpha channel) or grayscale
+    # Our model expects RGB (3 channels: Red, Green, Blue)
+    if image.mode != 'RGB':
+        logger.debug("Converting image from %s to RGB", image.mode)
+        image = image.convert('RGB')
+
+    # PIL decodes lazily - make sure it happens here, in the worker
+    # thread, so a corrupt upload fails its own request instead of the
+    # whole micro-batch
+    image.load()
+
+    logger.debug("Image loaded successfully: %s", image.size)
+    return image
+
+
+# ============================================================================
+# MICRO-BATCHING
+# ============================================================================
+
+# Requests that arrive within BATCH_TIMEOUT seconds of each other are
+# grouped (up to MAX_BATCH_SIZE images) and sent through the model in a
+# single forward pass. This pays the fixed per-call inference overhead
+# once per batch instead of once per request.
+MAX_BATCH_SIZE = 8  # Keep equal to the largest of model.BATCH_BUCKETS
+BATCH_TIMEOUT = 0.005  # 5 ms
+
+# Queue of (image, future) pairs waiting for a prediction
+# Created in lifespan() so it is bound to the server's event loop
+_batch_queue = None
+_batch_worker_task = None
+
+
+async def _batch_worker():
+    """
+    Background task that collects queued images into batches
+
+    Waits for the first request, then keeps collecting more until either
+    the batch is full or BATCH_TIMEOUT has passed. The batch is run
+    through classifier.predict_batch in a worker thread and each
+    request's future receives its own predictions.
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        items = [await _batch_queue.get()]
+        deadline = loop.time() + BATCH_TIMEOUT
+
+        # Collect more requests until the batch is full or time runs out
+        try:
+            while len(items) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                items.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            pass
+
+        images = [image for image, _ in items]
+        futures = [future for _, future in items]
+
+        try:
+            results = await run_in_threadpool(classifier.predict_batch, images)
+        except Exception as e:
+            # Fail every request in the batch with the same error
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        # Hand each request its own predictions
+        for future, predictions in zip(futures, results):
+            if not future.done():
+                future.set_result(predictions)
+
+
+async def _predict_batched(image):
+    """
+    Queue an image for the batch worker and wait for its predictions
+
+    Args:
+        image: Decoded RGB PIL Image
+
+    Returns:
+        list: Top predictions with labels and confidence scores
+    """
+    future = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((image, future))
+    return await future
+
+
 # ============================================================================
 # API ENDPOINTS (ROUTES)
 # ============================================================================
@@ -167,7 +346,9 @@ async def predict(file: UploadFile = File(...)):
 
     try:
         # Log the incoming request
-        logger.info(f"Received prediction request for file: {file.filename}")
+        # Per-request messages are logged at DEBUG level with lazy %s
+        # formatting, so they cost nothing when DEBUG logging is off
+        logger.debug("Received prediction request for file: %s", file.filename)
 
         # ----------------------------------------------------------------
         # STEP 1: Validate the uploaded file
@@ -189,49 +370,51 @@ async def predict(file: UploadFile = File(...)):
         # STEP 2: Read and process the image
         # ----------------------------------------------------------------
 
-        # Read the file contents into memory
+        # Read the file in chunks into an in-memory buffer
         # await is used because file reading is an async operation
-        contents = await file.read()
-
-        # Convert the bytes into a PIL Image object
-        # PIL (Python Imaging Library) is used for image manipulation
-        # io.BytesIO converts bytes into a file-like object
-        image = Image.open(io.BytesIO(contents))
-
-        # Convert image to RGB mode if it's not already
-        # Some images might be in RGBA (with alpha channel) or grayscale
-        # Our model expects RGB (3 channels: Red, Green, Blue)
-        if image.mode != 'RGB':
-            logger.info(f"Converting image from {image.mode} to RGB")
-            image = image.convert('RGB')
-
-        logger.info(f"Image loaded successfully: {image.size}")
+        # Stop as soon as the upload exceeds MAX_UPLOAD_SIZE
+        buffer = io.BytesIO()
+        size = 0
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)} MB"
+                )
+            buffer.write(chunk)
+        buffer.seek(0)
 
         # ----------------------------------------------------------------
-        # STEP 3: Make prediction using the model
+        # STEP 3: Decode the image and make a prediction
         # ----------------------------------------------------------------
 
-        # Call the predict method of our classifier
+        # Decoding blocks the CPU, so run it in a worker thread instead
+        # of on the event loop
+        image = await run_in_threadpool(_decode_image, buffer)
+
+        # Queue the image for the batch worker, which runs the model on
+        # all requests that arrive together in a single forward pass
         # This will:
         # 1. Preprocess the image (resize, normalize)
         # 2. Convert to PyTorch tensor
         # 3. Run through the neural network
         # 4. Return top predictions
-        predictions = classifier.predict(image)
+        predictions = await _predict_batched(image)
 
-        logger.info(f"Prediction successful: {predictions[0]['label']}")
+        logger.debug("Prediction successful: %s", predictions[0]['label'])
 
         # ----------------------------------------------------------------
         # STEP 4: Return the results
         # ----------------------------------------------------------------
 
-        # Return a JSON response with the predictions
-        return JSONResponse(content={
+        # Return the predictions - FastAPI serializes the dict to JSON
+        return {
             "success": True,
             "filename": file.filename,
             "predictions": predictions,
             "message": "Image classified successfully"
-        })
+        }
 
     except HTTPException as he:
         # Re-raise HTTP exceptions (validation errors)
@@ -293,9 +476,21 @@ if __name__ == "__main__":
     - host="0.0.0.0": Listen on all network interfaces
                       (allows external access, needed for deployment)
     - port=8000: Run on port 8000
-    - reload=True: Auto-reload when code changes (development only)
+    - loop="uvloop": Use uvloop instead of the default asyncio event loop
+    - http="httptools": Use the httptools HTTP parser
+    - workers: Number of worker processes (one per CPU core by default,
+               override with the WEB_CONCURRENCY environment variable)
+    - reload: Auto-reload when code changes (only when DEV=1, and then
+              with a single worker since reload and workers don't mix)
+    - access_log: Log every request (off unless UVICORN_ACCESS_LOG=1,
+                  since per-request logging noticeably slows the server)
     """
 
+    # DEV=1 enables auto-reload for local development
+    dev_mode = os.environ.get("DEV") == "1"
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    access_log = os.environ.get("UVICORN_ACCESS_LOG", "0") == "1"
+
     # Print startup message
     print("=" * 70)
     print("Starting Image Classification API")
@@ -309,5 +504,10 @@ if __name__ == "__main__":
         "app:app",  # Format: "filename:app_variable"
         host="0.0.0.0",
         port=8000,
-        reload=True  # Set to False in production
+        loop="uvloop",      # Faster event loop (installed by uvicorn[standard])
+        http="httptools",   # Faster HTTP parser (installed by uvicorn[standard])
+        workers=1 if dev_mode else workers,
+        reload=dev_mode,
+        access_log=access_log,
+        log_level="info" if dev_mode else "warning"
     )
@@ -8,12 +8,17 @@ Author: Your Name
 Date: 2026
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
-from typing import List, Dict
+from typing import List, Dict, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
 import io
+import os
+import threading
 from PIL import Image
 import numpy as np
 import logging
@@ -21,10 +26,174 @@ import logging
 # Import our model handler
 from model import ModelHandler
 
+# Optional: PyTurboJPEG for faster (SIMD) JPEG decoding
+# Install with: pip install PyTurboJPEG (needs the libturbojpeg library)
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJCS_CMYK, TJCS_YCCK
+    turbo_jpeg = TurboJPEG()
+except Exception:
+    turbo_jpeg = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upload limits
+# Files are read in chunks and rejected as soon as they exceed
+# MAX_UPLOAD_SIZE, so a huge upload can't exhaust the server's memory
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10 MB
+UPLOAD_CHUNK_SIZE = 64 * 1024       # 64 KB
+
+# File signatures ("magic bytes") of the supported image formats
+IMAGE_SIGNATURES = (
+    b"\xff\xd8\xff",             # JPEG
+    b"\x89PNG\r\n\x1a\n",        # PNG
+    b"GIF87a", b"GIF89a",        # GIF
+    b"BM",                       # BMP
+    b"II*\x00", b"MM\x00*",      # TIFF
+)
+
+# Prediction cache
+# With CACHE_PREDICTIONS=1, /predict remembers the predictions for the last
+# PREDICTION_CACHE_SIZE distinct uploads (keyed by a hash of the file
+# contents) and answers repeated uploads without running the model.
+# Only enable this for deterministic models.
+CACHE_PREDICTIONS = os.getenv("CACHE_PREDICTIONS") == "1"
+PREDICTION_CACHE_SIZE = 1024
+_prediction_cache: "OrderedDict[bytes, list]" = OrderedDict()
+
+
+def get_cached_predictions(key: bytes) -> Optional[list]:
+    """
+    Look up cached predictions, marking them as recently used
+
+    Args:
+        key (bytes): Digest of the uploaded file contents
+
+    Returns:
+        list: The cached predictions, or None if not cached
+    """
+    predictions = _prediction_cache.get(key)
+    if predictions is not None:
+        _prediction_cache.move_to_end(key)
+    return predictions
+
+
+def cache_predictions(key: bytes, predictions: list):
+    """
+    Store predictions, evicting the least recently used entry when full
+
+    Args:
+        key (bytes): Digest of the uploaded file contents
+        predictions (list): Predictions for that file
+    """
+    _prediction_cache[key] = predictions
+    if len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+        _prediction_cache.popitem(last=False)
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Read an uploaded image in chunks, enforcing the size limit
+
+    Args:
+        file (UploadFile): The uploaded file
+
+    Returns:
+        bytes: The file contents
+
+    Raises:
+        HTTPException: 413 if the file is larger than MAX_UPLOAD_SIZE,
+                       400 if the contents are not a supported image format
+    """
+    chunks = []
+    total = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        total += len(chunk)
+        if total > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)} MB"
+            )
+        chunks.append(chunk)
+
+    contents = b"".join(chunks)
+
+    # Check the magic bytes before handing the data to PIL
+    is_webp = contents[:4] == b"RIFF" and contents[8:12] == b"WEBP"
+    if not (contents.startswith(IMAGE_SIGNATURES) or is_webp):
+        raise HTTPException(
+            status_code=400,
+            detail="File contents are not a supported image format"
+        )
+
+    return contents
+
+
+def decode_image(contents: bytes, target_size) -> Image.Image:
+    """
+    Decode uploaded image bytes into an RGB PIL Image
+
+    JPEGs are decoded at a reduced scale (1/2, 1/4 or 1/8) when the
+    result is still at least `target_size`, since the model resizes to
+    224x224 anyway. This makes decoding large photos several times faster.
+
+    Args:
+        contents (bytes): Raw image file contents
+        target_size (tuple): Smallest (width, height) that is still needed
+
+    Returns:
+        PIL.Image: Decoded RGB image
+    """
+    # Fast path: PyTurboJPEG with scaled decoding
+    # CMYK/YCCK JPEGs and anything TurboJPEG fails on go through PIL below
+    if turbo_jpeg is not None and contents[:3] == b"\xff\xd8\xff":
+        try:
+            width, height, _, colorspace = turbo_jpeg.decode_header(contents)
+            if colorspace not in (TJCS_CMYK, TJCS_YCCK):
+                scaling_factor = None
+                for factor in ((1, 8), (1, 4), (1, 2)):
+                    if (width * factor[0] // factor[1] >= target_size[0]
+                            and height * factor[0] // factor[1] >= target_size[1]):
+                        scaling_factor = factor
+                        break
+                pixels = turbo_jpeg.decode(contents, pixel_format=TJPF_RGB, scaling_factor=scaling_factor)
+                return Image.fromarray(pixels)
+        except Exception as e:
+            logger.debug("TurboJPEG could not decode the image, using PIL: %s", e)
+
+    # PIL: draft() lets libjpeg decode JPEGs at a reduced scale
+    # (no-op for other formats)
+    image = Image.open(io.BytesIO(contents))
+    image.draft('RGB', target_size)
+
+    # Convert to RGB if necessary (RGBA, grayscale, palette, ...)
+    # For RGBA this drops the alpha channel in a single pass
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    return image
+
+
+def load_image(contents: bytes, target_size) -> Image.Image:
+    """
+    Decode uploaded image bytes and force the pixel data to load
+
+    PIL opens images lazily, so load() makes sure all decoding work
+    (and any error from a corrupt file) happens here, e.g. inside a
+    worker thread, rather than later during preprocessing.
+
+    Args:
+        contents (bytes): Raw image file contents
+        target_size (tuple): Smallest (width, height) that is still needed
+
+    Returns:
+        PIL.Image: Fully decoded RGB image
+    """
+    image = decode_image(contents, target_size)
+    image.load()
+    return image
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Deep Learning Image Classification API",
@@ -49,8 +218,53 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Initialize the model handler
-model_handler = ModelHandler()
+# Process-wide model handler, set by the first successful load
+_model_handler: Optional[ModelHandler] = None
+# Error from a failed load; kept so requests fail fast instead of retrying
+_model_load_error: Optional[Exception] = None
+# Only one thread may load the model
+_model_lock = threading.Lock()
+
+
+def get_model_handler() -> ModelHandler:
+    """
+    Return the process-wide model handler, loading the model on first use
+
+    Every request (and any script or test that imports this module)
+    shares one copy of the model weights. The model is loaded once,
+    under a lock; if that fails, the error is remembered and every later
+    call fails right away with 503 instead of loading the model again.
+
+    Set MODEL_QUANTIZE=0 to serve the full-precision model through the
+    XLA-compiled graph instead of the int8 TensorFlow Lite interpreter.
+
+    Returns:
+        ModelHandler: Handler with the model loaded
+
+    Raises:
+        HTTPException: 503 if the model could not be loaded
+    """
+    global _model_handler, _model_load_error
+
+    if _model_handler is not None:
+        return _model_handler
+
+    with _model_lock:
+        if _model_handler is None and _model_load_error is None:
+            try:
+                handler = ModelHandler(quantize=os.getenv("MODEL_QUANTIZE", "1") == "1")
+                handler.load_model()
+                _model_handler = handler
+            except Exception as e:
+                _model_load_error = e
+
+    if _model_handler is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model not available: {str(_model_load_error)}"
+        )
+    return _model_handler
+
 
 # Startup event - Load model when server starts
 @app.on_event("startup")
@@ -61,7 +275,7 @@ async def startup_event():
     """
     logger.info("Loading deep learning model...")
     try:
-        model_handler.load_model()
+        get_model_handler()
         logger.info("Model loaded successfully!")
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
@@ -101,13 +315,16 @@ async def health_check():
     """
     return {
         "status": "healthy",
-        "model_loaded": model_handler.model is not None
+        "model_loaded": _model_handler is not None
     }
 
 
 # Prediction endpoint
 @app.post("/predict")
-async def predict_image(file: UploadFile = File(...)):
+async def predict_image(
+    file: UploadFile = File(...),
+    model_handler: ModelHandler = Depends(get_model_handler)
+):
     """
     Upload an image and get classification predictions
 
@@ -130,17 +347,28 @@ async def predict_image(file: UploadFile = File(...)):
 
         # Read image file
         logger.info(f"Processing image: {file.filename}")
-        contents = await file.read()
+        contents = await read_upload(file)
+
+        # Identical files give identical predictions, so serve repeated
+        # uploads from the cache (hashing is far cheaper than inference)
+        cache_key = None
+        predictions = None
+        if CACHE_PREDICTIONS:
+            cache_key = hashlib.blake2b(contents, digest_size=16).digest()
+            predictions = get_cached_predictions(cache_key)
+
+        if predictions is None:
+            # Decoding and inference are CPU-bound, so run them in the
+            # threadpool to keep the event loop free for other requests
 
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(contents))
+            # Convert to an RGB PIL Image, decoding JPEGs at reduced scale
+            image = await asyncio.to_thread(load_image, contents, model_handler.input_shape)
 
-        # Convert RGBA to RGB if necessary
-        if image.mode == 'RGBA':
-            image = image.convert('RGB')
+            # Get predictions from model
+            predictions = await asyncio.to_thread(model_handler.predict, image)
 
-        # Get predictions from model
-        predictions = model_handler.predict(image)
+            if cache_key is not None:
+                cache_predictions(cache_key, predictions)
 
         logger.info(f"Predictions generated for {file.filename}")
 
@@ -164,7 +392,10 @@ async def predict_image(file: UploadFile = File(...)):
 
 # Batch prediction endpoint (optional - for multiple images)
 @app.post("/predict/batch")
-async def predict_batch(files: List[UploadFile] = File(...)):
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    model_handler: ModelHandler = Depends(get_model_handler)
+):
     """
     Upload multiple images and get classification predictions for each
 
@@ -183,42 +414,79 @@ async def predict_batch(files: List[UploadFile] = File(...)):
             detail="Maximum 10 images allowed per batch"
         )
 
-    results = []
+    # One result slot per file, in upload order
+    results = [None] * len(files)
 
-    for file in files:
+    # Uploads that were read successfully, with their position in `results`
+    uploads = []
+
+    for index, file in enumerate(files):
         try:
             # Validate file type
             if not file.content_type.startswith('image/'):
-                results.append({
+                results[index] = {
                     "filename": file.filename,
                     "success": False,
                     "error": "File must be an image"
-                })
+                }
                 continue
 
-            # Read and process image
-            contents = await file.read()
-            image = Image.open(io.BytesIO(contents))
-
-            if image.mode == 'RGBA':
-                image = image.convert('RGB')
-
-            # Get predictions
-            predictions = model_handler.predict(image)
-
-            results.append({
-                "filename": file.filename,
-                "success": True,
-                "predictions": predictions
-            })
+            uploads.append((index, await read_upload(file)))
 
         except Exception as e:
             logger.error(f"Error processing {file.filename}: {str(e)}")
-            results.append({
+            results[index] = {
                 "filename": file.filename,
                 "success": False,
                 "error": str(e)
-            })
+            }
+
+    # Decode all images in parallel in the threadpool
+    # (PIL releases the GIL while decoding)
+    # A corrupt file only fails its own entry
+    decoded = await asyncio.gather(
+        *(asyncio.to_thread(load_image, contents, model_handler.input_shape)
+          for _, contents in uploads),
+        return_exceptions=True
+    )
+
+    # Images that decoded successfully, with their position in `results`
+    images = []
+    positions = []
+
+    for (index, _), image in zip(uploads, decoded):
+        if isinstance(image, Exception):
+            logger.error(f"Error processing {files[index].filename}: {str(image)}")
+            results[index] = {
+                "filename": files[index].filename,
+                "success": False,
+                "error": str(image)
+            }
+            continue
+
+        images.append(image)
+        positions.append(index)
+
+    # Run all valid images through the model in a single batch
+    if images:
+        try:
+            batch_predictions = await asyncio.to_thread(model_handler.predict_batch, images)
+
+            for index, predictions in zip(positions, batch_predictions):
+                results[index] = {
+                    "filename": files[index].filename,
+                    "success": True,
+                    "predictions": predictions
+                }
+
+        except Exception as e:
+            logger.error(f"Error during batch prediction: {str(e)}")
+            for index in positions:
+                results[index] = {
+                    "filename": files[index].filename,
+                    "success": False,
+                    "error": str(e)
+                }
 
     return JSONResponse(content={
         "success": True,
@@ -229,7 +497,7 @@ async def predict_batch(files: List[UploadFile] = File(...)):
 
 # Model info endpoint
 @app.get("/model/info")
-async def model_info():
+async def model_info(model_handler: ModelHandler = Depends(get_model_handler)):
     """
     Get information about the loaded model
 
@@ -243,10 +511,18 @@ async def model_info():
 if __name__ == "__main__":
     # Run the server
     # For production, use: uvicorn main:app --host 0.0.0.0 --port $PORT
+    # Set DEV=1 for auto-reload during development (single worker)
+    # WEB_CONCURRENCY sets the number of worker processes; each worker
+    # loads its own copy of the model (get_model_handler) in startup_event
+    dev_mode = os.getenv("DEV") == "1"
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,  # Auto-reload on code changes (development only)
+        loop="uvloop",      # Faster event loop (installed by uvicorn[standard])
+        http="httptools",   # Faster HTTP parser (installed by uvicorn[standard])
+        workers=1 if dev_mode else int(os.getenv("WEB_CONCURRENCY", "2")),
+        reload=dev_mode,  # Auto-reload on code changes (development only)
         log_level="info"
     )
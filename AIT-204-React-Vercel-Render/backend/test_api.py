@@ -3,9 +3,14 @@ Test script for FastAPI backend
 
 Run this script to test your API endpoints locally.
 Usage: python test_api.py
+
+The tests are independent, so they run concurrently with httpx
+(pip install httpx). Each test collects its output and the reports are
+printed in order once all tests have finished.
 """
 
-import requests
+import asyncio
+import httpx
 import os
 import sys
 from pathlib import Path
@@ -15,120 +20,134 @@ API_URL = "http://localhost:8000"
 TEST_IMAGE_PATH = "test_image.jpg"  # Replace with your test image
 
 
-def test_health():
+async def test_health(client):
     """Test health endpoint"""
-    print("\n1. Testing /health endpoint...")
+    out = ["\n1. Testing /health endpoint..."]
     try:
-        response = requests.get(f"{API_URL}/health")
+        response = await client.get("/health")
         if response.status_code == 200:
             data = response.json()
-            print(f"   ✓ Status: {data['status']}")
-            print(f"   ✓ Model loaded: {data['model_loaded']}")
-            return True
+            out.append(f"   ✓ Status: {data['status']}")
+            out.append(f"   ✓ Model loaded: {data['model_loaded']}")
+            return True, out
         else:
-            print(f"   ✗ Error: Status code {response.status_code}")
-            return False
-    except requests.exceptions.ConnectionError:
-        print(f"   ✗ Cannot connect to {API_URL}")
-        print("   Make sure the backend is running!")
-        return False
+            out.append(f"   ✗ Error: Status code {response.status_code}")
+            return False, out
+    except httpx.ConnectError:
+        out.append(f"   ✗ Cannot connect to {API_URL}")
+        out.append("   Make sure the backend is running!")
+        return False, out
     except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return False
+        out.append(f"   ✗ Error: {e}")
+        return False, out
 
 
-def test_root():
+async def test_root(client):
     """Test root endpoint"""
-    print("\n2. Testing / endpoint...")
+    out = ["\n2. Testing / endpoint..."]
     try:
-        response = requests.get(f"{API_URL}/")
+        response = await client.get("/")
         if response.status_code == 200:
             data = response.json()
-            print(f"   ✓ Message: {data['message']}")
-            print(f"   ✓ Status: {data['status']}")
-            return True
+            out.append(f"   ✓ Message: {data['message']}")
+            out.append(f"   ✓ Status: {data['status']}")
+            return True, out
         else:
-            print(f"   ✗ Error: Status code {response.status_code}")
-            return False
+            out.append(f"   ✗ Error: Status code {response.status_code}")
+            return False, out
     except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return False
+        out.append(f"   ✗ Error: {e}")
+        return False, out
 
 
-def test_model_info():
+async def test_model_info(client):
     """Test model info endpoint"""
-    print("\n3. Testing /model/info endpoint...")
+    out = ["\n3. Testing /model/info endpoint..."]
     try:
-        response = requests.get(f"{API_URL}/model/info")
+        response = await client.get("/model/info")
         if response.status_code == 200:
             data = response.json()
-            print(f"   ✓ Model: {data['model_name']}")
-            print(f"   ✓ Framework: {data['framework']}")
-            print(f"   ✓ Loaded: {data['loaded']}")
-            return True
+            out.append(f"   ✓ Model: {data['model_name']}")
+            out.append(f"   ✓ Framework: {data['framework']}")
+            out.append(f"   ✓ Loaded: {data['loaded']}")
+            return True, out
         else:
-            print(f"   ✗ Error: Status code {response.status_code}")
-            return False
+            out.append(f"   ✗ Error: Status code {response.status_code}")
+            return False, out
     except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return False
+        out.append(f"   ✗ Error: {e}")
+        return False, out
 
 
-def test_prediction(image_path):
+async def test_prediction(client, image_path):
     """Test prediction endpoint"""
-    print("\n4. Testing /predict endpoint...")
+    out = ["\n4. Testing /predict endpoint..."]
 
     # Check if test image exists
     if not os.path.exists(image_path):
-        print(f"   ✗ Test image not found: {image_path}")
-        print(f"   Please provide a test image or update TEST_IMAGE_PATH")
-        return False
+        out.append(f"   ✗ Test image not found: {image_path}")
+        out.append(f"   Please provide a test image or update TEST_IMAGE_PATH")
+        return False, out
 
     try:
         # Open and send image
         with open(image_path, 'rb') as f:
-            files = {'file': f}
-            response = requests.post(
-                f"{API_URL}/predict",
-                files=files,
-                timeout=30
-            )
+            files = {'file': (Path(image_path).name, f)}
+            response = await client.post("/predict", files=files)
 
         if response.status_code == 200:
             data = response.json()
-            print(f"   ✓ Success: {data['success']}")
-            print(f"   ✓ Filename: {data['filename']}")
-            print(f"\n   Top Predictions:")
+            out.append(f"   ✓ Success: {data['success']}")
+            out.append(f"   ✓ Filename: {data['filename']}")
+            out.append(f"\n   Top Predictions:")
             for i, pred in enumerate(data['predictions'][:3], 1):
                 confidence = pred['confidence'] * 100
-                print(f"   {i}. {pred['class']}: {confidence:.2f}%")
-            return True
+                out.append(f"   {i}. {pred['class']}: {confidence:.2f}%")
+            return True, out
         else:
-            print(f"   ✗ Error: Status code {response.status_code}")
-            print(f"   Response: {response.text}")
-            return False
+            out.append(f"   ✗ Error: Status code {response.status_code}")
+            out.append(f"   Response: {response.text}")
+            return False, out
 
-    except requests.exceptions.Timeout:
-        print(f"   ✗ Request timeout (>30s)")
-        return False
+    except httpx.TimeoutException:
+        out.append(f"   ✗ Request timeout (>30s)")
+        return False, out
     except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return False
+        out.append(f"   ✗ Error: {e}")
+        return False, out
 
 
-def main():
+async def main():
     """Run all tests"""
     print("=" * 50)
     print("FastAPI Backend Test Suite")
     print("=" * 50)
     print(f"Testing API at: {API_URL}")
 
-    # Run tests
+    # Run tests concurrently over one pooled client
+    # The transport retries failed connections (e.g. while
+    # `uvicorn --reload` restarts the server) before a test fails
+    transport = httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=8)
+    )
+    async with httpx.AsyncClient(
+        base_url=API_URL,
+        timeout=30,
+        transport=transport
+    ) as client:
+        outcomes = await asyncio.gather(
+            test_health(client),
+            test_root(client),
+            test_model_info(client),
+            test_prediction(client, TEST_IMAGE_PATH)
+        )
+
+    test_names = ["Health Check", "Root Endpoint", "Model Info", "Prediction"]
     results = []
-    results.append(("Health Check", test_health()))
-    results.append(("Root Endpoint", test_root()))
-    results.append(("Model Info", test_model_info()))
-    results.append(("Prediction", test_prediction(TEST_IMAGE_PATH)))
+    for test_name, (result, out) in zip(test_names, outcomes):
+        print("\n".join(out))
+        results.append((test_name, result))
 
     # Summary
     print("\n" + "=" * 50)
@@ -151,4 +170,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -18,18 +18,23 @@ Author: AIT-204 Cloud Deployment Course
 # Import required libraries
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+import os
 import time
 from datetime import datetime
 import logging
-from typing import Dict, List
-import io
+from typing import BinaryIO, Dict, List, Tuple
+import asyncio
+import orjson
 from PIL import Image
-import numpy as np
 
 # Import our custom modules
 from app.model import ImageClassifier
-from app.utils import validate_image, format_predictions
+from app.utils import (
+    validate_image,
+    format_predictions_to_json,
+    MAX_FILE_SIZE
+)
 
 # Configure logging for debugging and monitoring
 logging.basicConfig(
@@ -44,9 +49,166 @@ app = FastAPI(
     description="API for classifying images using pre-trained MobileNetV2 model",
     version="1.0.0",
     docs_url="/docs",  # Swagger UI documentation
-    redoc_url="/redoc"  # ReDoc documentation
+    redoc_url="/redoc",  # ReDoc documentation
+    # Serialize responses with orjson (a C extension), which is much
+    # faster than the standard json module for the predictions lists
+    default_response_class=ORJSONResponse
 )
 
+# ============================================================================
+# Initialize ML Model
+# ============================================================================
+# Load the model when the application starts (singleton pattern)
+# This happens once, not on every request, for better performance
+
+logger.info("Loading ML model...")
+try:
+    # MODEL_QUANTIZE=0 serves the float model through an XLA-compiled
+    # graph instead of the int8 TensorFlow Lite interpreter
+    classifier = ImageClassifier(quantize=os.getenv("MODEL_QUANTIZE", "1") == "1")
+    logger.info("✓ Model loaded successfully")
+except Exception as e:
+    logger.error(f"✗ Failed to load model: {str(e)}")
+    classifier = None
+
+# ============================================================================
+# Image Decoding
+# ============================================================================
+
+# Maximum number of images per batch
+# (per /predict_batch request, and per dynamically batched model call)
+MAX_BATCH_SIZE = 16
+
+
+def _upload_size(file: UploadFile) -> int:
+    """
+    Get the size of an uploaded file in bytes without reading it
+
+    Args:
+        file: The uploaded file
+
+    Returns:
+        File size in bytes
+    """
+    # UploadFile.file is a SpooledTemporaryFile that is already fully
+    # received, so seeking to the end gives its size
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+
+def _decode_image(fp: BinaryIO) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Decode an uploaded image file into an RGB PIL Image
+
+    PIL reads straight from the upload's spooled file, so the image is
+    never copied into a separate bytes object first.
+    Decoding is CPU-bound, so endpoints run this in a worker thread
+    (asyncio.to_thread) to keep the event loop free.
+
+    Args:
+        fp: Binary file object with the image (e.g. UploadFile.file)
+
+    Returns:
+        Tuple of the fully decoded RGB PIL Image (the classifier resizes
+        it with PIL, so no numpy copy of the full-size image is needed)
+        and the (width, height) of the uploaded image
+    """
+    image = Image.open(fp)
+
+    # draft() below can shrink image.size, so keep the uploaded dimensions
+    original_size = image.size
+
+    # Let libjpeg decode large JPEGs at 1/2, 1/4 or 1/8 scale, as long as
+    # the result is still at least 224x224 (the model's input size)
+    # This skips most of the decoding work for big phone photos
+    if image.format == 'JPEG':
+        image.draft('RGB', (224, 224))
+
+    # Convert to RGB if necessary (handles PNG with alpha channel, etc.)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    # PIL decodes lazily - make sure it happens here, in the worker thread
+    image.load()
+
+    return image, original_size
+
+
+# ============================================================================
+# Request Size Limits
+# ============================================================================
+# The upload size checks in the endpoints only run after FastAPI has
+# received and spooled the whole request body. This middleware rejects
+# oversized requests while the body is still arriving: immediately if
+# the Content-Length header is already too large, and otherwise (e.g.
+# chunked uploads) as soon as more bytes than allowed have been received.
+
+# Allowance for the multipart form encoding around the file data
+MULTIPART_OVERHEAD = 64 * 1024  # 64 KB
+
+# Largest accepted request body per upload endpoint
+MAX_REQUEST_SIZE = {
+    "/predict": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/predict_batch": MAX_BATCH_SIZE * (MAX_FILE_SIZE + MULTIPART_OVERHEAD),
+}
+
+REQUEST_TOO_LARGE = f"Request too large. Maximum file size is {MAX_FILE_SIZE // (1024 * 1024)} MB."
+
+
+class LimitRequestSizeMiddleware:
+    """
+    Reject oversized uploads with 413 before the whole body is read
+
+    A plain ASGI middleware (not @app.middleware("http")), so requests to
+    other paths, such as /health, pass straight through without an extra
+    task or stream wrapped around them.
+    """
+
+    def __init__(self, app, max_sizes: Dict[str, int]):
+        self.app = app
+        self.max_sizes = max_sizes
+
+    async def __call__(self, scope, receive, send):
+        max_size = self.max_sizes.get(scope["path"]) if scope["type"] == "http" else None
+        if max_size is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Declared size too large: reject without reading the body
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > max_size:
+                    response = JSONResponse(
+                        status_code=413,
+                        content={"detail": REQUEST_TOO_LARGE}
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        # Count the body bytes as they arrive, since the header can be
+        # missing (chunked uploads) or wrong
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_size:
+                    # Raised while FastAPI parses the form; it is turned
+                    # into the same 413 response as above
+                    raise HTTPException(status_code=413, detail=REQUEST_TOO_LARGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(LimitRequestSizeMiddleware, max_sizes=MAX_REQUEST_SIZE)
+
+
 # ============================================================================
 # CORS Configuration
 # ============================================================================
@@ -58,32 +220,102 @@ allowed_origins = [
     "http://localhost:5173",  # Vite dev server (default)
     "http://localhost:3000",  # Alternative React dev port
     "http://localhost:5174",  # Alternative Vite port
-    "https://*.vercel.app",   # Vercel preview deployments
     "https://your-app.vercel.app",  # Your production frontend URL
 ]
 
+# Vercel preview deployments (https://<anything>.vercel.app)
+# Wildcards don't work in allow_origins, so these are matched by a regex,
+# which Starlette compiles once at startup
+allowed_origin_regex = r"^https://([a-z0-9-]+\.)*vercel\.app$"
+
 # Add CORS middleware to allow cross-origin requests
+# Added after LimitRequestSizeMiddleware, so it wraps it (the last added
+# middleware runs first) and 413 responses also carry CORS headers
+# An explicit origin list is required with allow_credentials=True:
+# browsers reject credentialed responses for a "*" origin
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
+    allow_origins=allowed_origins,
+    allow_origin_regex=allowed_origin_regex,
     allow_credentials=True,  # Allow cookies and authentication headers
-    allow_methods=["*"],  # Allow all HTTP methods (GET, POST, etc.)
+    allow_methods=["GET", "POST"],  # The only methods this API uses
     allow_headers=["*"],  # Allow all headers
+    max_age=3600,  # Let browsers cache preflight responses for an hour
 )
 
 # ============================================================================
-# Initialize ML Model
+# Dynamic Batching
 # ============================================================================
-# Load the model when the application starts (singleton pattern)
-# This happens once, not on every request, for better performance
+# Concurrent /predict requests that arrive within BATCH_TIMEOUT seconds of
+# each other are grouped (up to MAX_BATCH_SIZE images) and sent through the
+# model in a single call. This pays the fixed per-call inference overhead
+# once per batch instead of once per request, while a lone request only
+# waits BATCH_TIMEOUT extra.
+
+BATCH_TIMEOUT = 0.015  # 15 ms
+
+# Created in startup_event (must be created inside the running event loop)
+_batch_queue = None
+_batch_worker_task = None
+
+
+async def _batch_worker():
+    """
+    Background task that collects queued images into batches
+
+    Waits for the first request, then keeps collecting more until either
+    the batch is full or BATCH_TIMEOUT has passed. The batch is run
+    through classifier.predict_batch in a worker thread and each
+    request's future receives its own predictions.
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        items = [await _batch_queue.get()]
+        deadline = loop.time() + BATCH_TIMEOUT
+
+        # Collect more requests until the batch is full or time runs out
+        try:
+            while len(items) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                items.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            pass
+
+        images = [image for image, _ in items]
+        futures = [future for _, future in items]
+
+        try:
+            results = await asyncio.to_thread(classifier.predict_batch, images)
+        except Exception as e:
+            # Fail every request in the batch with the same error
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        # Hand each request its own predictions
+        for future, predictions in zip(futures, results):
+            if not future.done():
+                future.set_result(predictions)
+
+
+async def _predict_batched(image: Image.Image) -> List:
+    """
+    Queue an image for the batch worker and wait for its predictions
+
+    Args:
+        image: Decoded RGB PIL Image
+
+    Returns:
+        List of tuples: [(class_id, class_name, confidence), ...]
+    """
+    future = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((image, future))
+    return await future
 
-logger.info("Loading ML model...")
-try:
-    classifier = ImageClassifier()
-    logger.info("✓ Model loaded successfully")
-except Exception as e:
-    logger.error(f"✗ Failed to load model: {str(e)}")
-    classifier = None
 
 # ============================================================================
 # API Endpoints
@@ -135,7 +367,7 @@ async def health_check() -> Dict:
 
 
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)) -> JSONResponse:
+async def predict(file: UploadFile = File(...)) -> Dict:
     """
     Main prediction endpoint - Classifies uploaded images
 
@@ -152,10 +384,11 @@ async def predict(file: UploadFile = File(...)) -> JSONResponse:
                           Recommended size: < 10MB
 
     Returns:
-        JSONResponse: Predictions with confidence scores
+        dict: Predictions with confidence scores
 
     Raises:
         HTTPException: 400 if file is invalid
+        HTTPException: 413 if file is larger than MAX_FILE_SIZE
         HTTPException: 500 if processing fails
 
     Example Request:
@@ -203,7 +436,14 @@ async def predict(file: UploadFile = File(...)) -> JSONResponse:
         # Validate image format
         validate_image(file.filename)
 
-        logger.info(f"Processing image: {file.filename} ({file.content_type})")
+        # Check file size before decoding anything
+        if _upload_size(file) > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)} MB."
+            )
+
+        logger.debug("Processing image: %s (%s)", file.filename, file.content_type)
 
     except ValueError as e:
         logger.warning(f"File validation failed: {str(e)}")
@@ -213,18 +453,11 @@ async def predict(file: UploadFile = File(...)) -> JSONResponse:
     # Step 3: Read and process image
     # ========================================================================
     try:
-        # Read file contents into memory
-        contents = await file.read()
-
-        # Open image using PIL
-        image = Image.open(io.BytesIO(contents))
+        # Decode to an RGB image in a worker thread, so other
+        # requests are served while this image is decoded
+        image, image_size = await asyncio.to_thread(_decode_image, file.file)
 
-        # Convert to RGB if necessary (handles PNG with alpha channel, etc.)
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-            logger.info(f"Converted image from {image.mode} to RGB")
-
-        logger.info(f"Image loaded: {image.size} pixels")
+        logger.debug("Image loaded: %s pixels (uploaded %s)", image.size, image_size)
 
     except Exception as e:
         logger.error(f"Failed to read image: {str(e)}")
@@ -237,16 +470,14 @@ async def predict(file: UploadFile = File(...)) -> JSONResponse:
     # Step 4: Run ML prediction
     # ========================================================================
     try:
-        # Convert PIL Image to numpy array
-        image_array = np.array(image)
-
         # Get predictions from the model
-        predictions = classifier.predict(image_array)
+        # Concurrent requests are batched into one model call, which runs
+        # in a worker thread (see _batch_worker)
+        predictions = await _predict_batched(image)
 
-        # Format predictions for response
-        formatted_predictions = format_predictions(predictions, top_k=5)
-
-        logger.info(f"Predictions generated: {formatted_predictions[0]['class']}")
+        # Format predictions for response, straight to JSON bytes
+        # (no dict per prediction; embedded as-is with orjson.Fragment)
+        predictions_json = format_predictions_to_json(predictions, top_k=5)
 
     except Exception as e:
         logger.error(f"Prediction failed: {str(e)}")
@@ -260,18 +491,152 @@ async def predict(file: UploadFile = File(...)) -> JSONResponse:
     # ========================================================================
     processing_time = time.time() - start_time
 
-    response = {
+    # Returned as a response object so FastAPI hands the content (with
+    # its pre-serialized fragment) directly to orjson
+    response = ORJSONResponse(content={
         "success": True,
-        "predictions": formatted_predictions,
+        "predictions": orjson.Fragment(predictions_json),
         "processing_time": round(processing_time, 3),
         "model": "MobileNetV2",
-        "image_size": image.size,
+        "image_size": image_size,
         "filename": file.filename
-    }
+    })
+
+    # One info line per request; the per-step logs above are debug-level
+    logger.info(
+        "Predicted %s as %s in %.3fs",
+        file.filename, predictions[0][1], processing_time
+    )
+
+    return response
+
+
+@app.post("/predict_batch")
+async def predict_batch(files: List[UploadFile] = File(...)) -> Dict:
+    """
+    Batch prediction endpoint - Classifies several uploaded images at once
+
+    All valid images are run through the model in a single call, which is
+    much faster than sending them one by one to /predict.
+    Invalid files only fail their own entry in the results.
+
+    Args:
+        files (List[UploadFile]): Image files uploaded by the client
+                                  (at most MAX_BATCH_SIZE)
+
+    Returns:
+        dict: One result per file, in upload order
+
+    Raises:
+        HTTPException: 400 if too many files are uploaded
+        HTTPException: 500 if model inference fails
+        HTTPException: 503 if the model is not loaded
+
+    Example Response:
+        {
+            "success": true,
+            "results": [
+                {
+                    "filename": "dog.jpg",
+                    "success": true,
+                    "predictions": [{"class": "Golden Retriever", "confidence": 0.89}, ...]
+                },
+                {
+                    "filename": "notes.pdf",
+                    "success": false,
+                    "error": "File type '.pdf' is not allowed. ..."
+                }
+            ],
+            "processing_time": 0.412,
+            "model": "MobileNetV2"
+        }
+    """
+    start_time = time.time()
 
-    logger.info(f"Request completed in {processing_time:.3f}s")
+    if classifier is None:
+        logger.error("Model not loaded - cannot process request")
+        raise HTTPException(
+            status_code=503,
+            detail="Model not available. Please try again later."
+        )
 
-    return JSONResponse(content=response)
+    if len(files) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum is {MAX_BATCH_SIZE} images per batch."
+        )
+
+    # One result slot per file, in upload order
+    results = [None] * len(files)
+
+    # Validate file types and sizes first, so invalid files are never decoded
+    valid = []
+    for index, file in enumerate(files):
+        try:
+            if not file.content_type.startswith("image/"):
+                raise ValueError(f"Invalid file type: {file.content_type}. Please upload an image.")
+            validate_image(file.filename)
+            if _upload_size(file) > MAX_FILE_SIZE:
+                raise ValueError(f"File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)} MB.")
+            valid.append(index)
+        except ValueError as e:
+            results[index] = {"filename": file.filename, "success": False, "error": str(e)}
+
+    # Decode all images concurrently in worker threads
+    decoded = await asyncio.gather(
+        *(asyncio.to_thread(_decode_image, files[index].file) for index in valid),
+        return_exceptions=True
+    )
+
+    # Images that decoded successfully, with their position in `results`
+    images = []
+    positions = []
+    for index, result in zip(valid, decoded):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to read image {files[index].filename}: {str(result)}")
+            results[index] = {
+                "filename": files[index].filename,
+                "success": False,
+                "error": f"Could not read image file: {str(result)}"
+            }
+            continue
+        image, _ = result
+        images.append(image)
+        positions.append(index)
+
+    # Run all valid images through the model in a single call
+    if images:
+        try:
+            batch_predictions = await asyncio.to_thread(classifier.predict_batch, images)
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Model prediction failed: {str(e)}"
+            )
+
+        # Predictions are serialized straight to JSON bytes and embedded
+        # as-is (orjson.Fragment), without building a dict per prediction
+        for index, predictions in zip(positions, batch_predictions):
+            results[index] = {
+                "filename": files[index].filename,
+                "success": True,
+                "predictions": orjson.Fragment(
+                    format_predictions_to_json(predictions, top_k=5)
+                )
+            }
+
+    processing_time = time.time() - start_time
+    logger.info(f"Batch of {len(files)} images completed in {processing_time:.3f}s")
+
+    # Returned as a response object so FastAPI hands the content (with its
+    # pre-serialized fragments) directly to orjson
+    return ORJSONResponse(content={
+        "success": True,
+        "results": results,
+        "processing_time": round(processing_time, 3),
+        "model": "MobileNetV2"
+    })
 
 
 # ============================================================================
@@ -284,10 +649,23 @@ async def startup_event():
     Run when the application starts
     Useful for initializing resources, connections, etc.
     """
+    global _batch_queue, _batch_worker_task
+
+    # Skip uvicorn's per-request access log lines; each prediction
+    # already logs one summary line
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
     logger.info("=" * 50)
     logger.info("FastAPI Deep Learning API Starting...")
     logger.info("=" * 50)
     if classifier:
+        # Run one full request pipeline (preprocessing, inference and label
+        # decoding) on a blank image, so the first real request is fast
+        await asyncio.to_thread(classifier.predict, Image.new("RGB", (224, 224)))
+
+        # Start the dynamic batching worker for /predict
+        _batch_queue = asyncio.Queue()
+        _batch_worker_task = asyncio.create_task(_batch_worker())
         logger.info("✓ Model ready for predictions")
     else:
         logger.warning("✗ Model not loaded - predictions will fail")
@@ -301,6 +679,11 @@ async def shutdown_event():
     Useful for cleanup, closing connections, etc.
     """
     logger.info("Shutting down FastAPI application...")
+
+    # Stop the dynamic batching worker
+    if _batch_worker_task is not None:
+        _batch_worker_task.cancel()
+
     # Add cleanup code here if needed (close DB connections, etc.)
 
 